@@ -3,15 +3,27 @@
 Script to analyze DICOM headers and identify identical fields
 that might cause dcm2niix to flag files as duplicates.
 
+Headers are read in-process with pydicom when it is installed (every file
+in the directory is analyzed); otherwise the script falls back to running
+dcmdump on a sample of the files.
+
 Usage: python analyze_dicom_headers.py <dicom_directory>
 """
 
+import fnmatch
 import os
 import sys
-import glob
-from collections import defaultdict
+from collections import Counter
 import subprocess
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pydicom
+    from pydicom.errors import InvalidDicomError
+    HAS_PYDICOM = True
+except ImportError:
+    HAS_PYDICOM = False
 
 # Key DICOM fields that dcm2niix uses to identify duplicates
 CRITICAL_FIELDS = [
@@ -27,28 +39,82 @@ CRITICAL_FIELDS = [
     "SliceLocation"
 ]
 
+# Filename patterns for DICOM files, in priority order
+DICOM_FILE_PATTERNS = ['*.dcm', 'IM*', 'Image*', '*.[0-9][0-9][0-9][0-9]', 'DICOM*']
+
+# dcmdump costs a process launch per file, so the fallback path only samples
+# the directory. pydicom header reads are cheap enough to cover every file.
+DCMDUMP_SAMPLE_SIZE = 10
+
+# Files handed to each worker process per task when analyzing in parallel.
+ANALYSIS_CHUNKSIZE = 16
+
 
-def extract_dicom_field(dcmdump_output, field_name):
-    """Extract a specific field from dcmdump output."""
-    pattern = re.compile(rf"\({field_name}\).*\[(.*)\]")
-    match = pattern.search(dcmdump_output)
-    if match:
-        return match.group(1).strip()
-    return None
+# One dcmdump line per element, e.g.
+#   (0020,0013) IS [1]                                #   2, 1 InstanceNumber
+# A single alternation over every critical keyword lets one finditer pass pick
+# up all fields instead of re-scanning the output once per field. Elements
+# inside sequence items are printed indented, so anchoring at column 0 keeps
+# to top-level elements, the same ones the pydicom path reads.
+DCMDUMP_FIELD_PATTERN = re.compile(
+    r"^\([0-9A-Fa-f]{4},[0-9A-Fa-f]{4}\)\s+\w\w\s+\[(?P<value>[^\]]*)\]"
+    r".*#.*\b(?P<field>" + "|".join(CRITICAL_FIELDS) + r")\s*$",
+    re.MULTILINE,
+)
+
+
+def extract_dicom_fields(dcmdump_output):
+    """Extract all critical fields from dcmdump output in one pass."""
+    file_fields = dict.fromkeys(CRITICAL_FIELDS)
+    for match in DCMDUMP_FIELD_PATTERN.finditer(dcmdump_output):
+        file_fields[match.group("field")] = match.group("value").strip() or None
+    return file_fields
 
 
 def _find_dicom_files(dicom_dir):
-    """Find DICOM files in directory using common patterns."""
-    patterns = ['*.dcm', 'IM*', 'Image*', '*.[0-9][0-9][0-9][0-9]', 'DICOM*']
-    for pattern in patterns:
-        files = glob.glob(os.path.join(dicom_dir, pattern))
+    """Find DICOM files in directory using common patterns.
+
+    The directory is listed once; the patterns are then tried in priority
+    order against that listing and the first one with matches wins.
+    """
+    try:
+        with os.scandir(dicom_dir) as entries:
+            names = sorted(
+                entry.name for entry in entries
+                if entry.is_file() and not entry.name.startswith('.')
+            )
+    except OSError as e:
+        print(f"Error listing {dicom_dir}: {e}")
+        return []
+
+    for pattern in DICOM_FILE_PATTERNS:
+        files = [name for name in names if fnmatch.fnmatchcase(name, pattern)]
         if files:
             print(f"Found {len(files)} files with pattern {pattern}")
-            return files
+            return [os.path.join(dicom_dir, name) for name in files]
     return []
 
 
-def _extract_file_fields(file_path):
+def _read_fields_pydicom(file_path):
+    """Read the critical DICOM fields in-process with pydicom."""
+    try:
+        dataset = pydicom.dcmread(
+            file_path, stop_before_pixels=True, specific_tags=CRITICAL_FIELDS
+        )
+    except InvalidDicomError as e:
+        print(f"Error processing {file_path}: {e}")
+        return None
+
+    # Present-but-empty elements read as '' here; report them as missing
+    # (None), the same as the dcmdump path does for "(no value available)"
+    file_fields = {}
+    for field in CRITICAL_FIELDS:
+        value = dataset.get(field)
+        file_fields[field] = None if value is None else str(value).strip() or None
+    return file_fields
+
+
+def _read_fields_dcmdump(file_path):
     """Run dcmdump on a file and extract critical DICOM fields."""
     result = subprocess.run(
         ["dcmdump", file_path],
@@ -61,62 +127,83 @@ def _extract_file_fields(file_path):
         print(f"Error processing {file_path}: {result.stderr}")
         return None
 
-    file_fields = {}
-    for field in CRITICAL_FIELDS:
-        file_fields[field] = extract_dicom_field(result.stdout, field)
-    return file_fields
+    return extract_dicom_fields(result.stdout)
+
+
+def _extract_file_fields(file_path):
+    """Extract the critical DICOM fields from one file (None on error)."""
+    try:
+        if HAS_PYDICOM:
+            return _read_fields_pydicom(file_path)
+        return _read_fields_dcmdump(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Error processing {file_path}: {e}")
+        return None
+
+
+def _summarize_fields(field_counts):
+    """Reduce each field's value counts to (n_files, distinct values).
 
+    Built once and shared by the report sections below. The distinct set
+    keeps None so the combination checks can still treat "missing in every
+    file" as a shared value.
+    """
+    return {
+        field: (sum(field_counts[field].values()), set(field_counts[field]))
+        for field in CRITICAL_FIELDS
+    }
 
-def _report_field_analysis(all_fields):
+
+def _report_field_analysis(summary):
     """Report which fields are identical across all sampled files."""
     print("\n=== Field Analysis ===")
     for field in CRITICAL_FIELDS:
-        values = all_fields[field]
-        if not values:
+        n_files, distinct = summary[field]
+        if not n_files:
             print(f"{field}: No values found")
             continue
 
-        unique_values = set(val for val in values if val is not None)
+        unique_values = distinct - {None}
 
         if len(unique_values) == 1:
             print(
                 f"{field}: IDENTICAL across all files"
-                f" - value: {list(unique_values)[0]}"
+                f" - value: {next(iter(unique_values))}"
             )
         else:
             print(
                 f"{field}: {len(unique_values)} unique values"
-                f" out of {len(values)} files"
+                f" out of {n_files} files"
             )
 
 
-def _check_problematic_combinations(all_fields):
+def _check_problematic_combinations(summary):
     """Check for field combinations known to cause dcm2niix issues."""
     print("\n=== Problematic Combinations ===")
     time_fields = ["SeriesTime", "AcquisitionTime"]
     if all(
-        len(set(all_fields[f])) == 1
+        len(summary[f][1]) == 1
         for f in time_fields
-        if all_fields[f]
+        if summary[f][0]
     ):
         print("WARNING: All files have identical Series and Acquisition times")
 
     id_fields = ["InstanceNumber", "AcquisitionNumber"]
     if all(
-        len(set(all_fields[f])) == 1
+        len(summary[f][1]) == 1
         for f in id_fields
-        if all_fields[f]
+        if summary[f][0]
     ):
         print("WARNING: All files have identical Instance and Acquisition numbers")
 
 
-def _suggest_fix(all_fields):
+def _suggest_fix(summary):
     """Suggest dcm2niix flags based on identical fields found."""
     print("\n=== Recommended Fix ===")
     identical_fields = [
         f for f in CRITICAL_FIELDS
-        if all_fields[f]
-        and len(set(v for v in all_fields[f] if v is not None)) == 1
+        if summary[f][0]
+        and len(summary[f][1] - {None}) == 1
     ]
 
     if identical_fields:
@@ -139,42 +226,56 @@ def _suggest_fix(all_fields):
         )
 
 
-def analyze_dicom_directory(dicom_dir):
-    """Analyze all DICOM files in a directory to find identical headers."""
+def _iter_file_fields(file_paths, workers):
+    """Yield (path, fields) in file order, reading in parallel if workers > 1."""
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from zip(file_paths, pool.map(
+                _extract_file_fields, file_paths, chunksize=ANALYSIS_CHUNKSIZE
+            ))
+    else:
+        for file_path in file_paths:
+            yield file_path, _extract_file_fields(file_path)
+
+
+def analyze_dicom_directory(dicom_dir, workers=None):
+    """Analyze all DICOM files in a directory to find identical headers.
+
+    Files are read in parallel across `workers` processes (default: one per
+    CPU); results are reported in file order.
+    """
     dicom_files = _find_dicom_files(dicom_dir)
 
     if not dicom_files:
         print(f"No DICOM files found in {dicom_dir}")
         return
 
-    sample_files = dicom_files[:min(10, len(dicom_files))]
+    if HAS_PYDICOM:
+        sample_files = dicom_files
+    else:
+        sample_files = dicom_files[:min(DCMDUMP_SAMPLE_SIZE, len(dicom_files))]
     print(f"Analyzing {len(sample_files)} of {len(dicom_files)} files...")
 
-    all_fields = defaultdict(list)
-
-    for file_path in sample_files:
-        print(f"Processing {os.path.basename(file_path)}...")
-
-        try:
-            file_fields = _extract_file_fields(file_path)
-        except OSError as e:
-            print(f"Error processing {file_path}: {e}")
-            continue
+    # Per-field value counts: memory grows with distinct values, not files
+    field_counts = {field: Counter() for field in CRITICAL_FIELDS}
 
+    workers = min(workers or os.cpu_count() or 1, len(sample_files))
+    for file_path, file_fields in _iter_file_fields(sample_files, workers):
         if file_fields is None:
             continue
 
         for field, value in file_fields.items():
-            all_fields[field].append(value)
+            field_counts[field][value] += 1
 
         print(f"File: {os.path.basename(file_path)}")
         for field, value in file_fields.items():
             print(f"  {field}: {value}")
         print()
 
-    _report_field_analysis(all_fields)
-    _check_problematic_combinations(all_fields)
-    _suggest_fix(all_fields)
+    summary = _summarize_fields(field_counts)
+    _report_field_analysis(summary)
+    _check_problematic_combinations(summary)
+    _suggest_fix(summary)
 
 
 if __name__ == "__main__":
@@ -114,45 +114,67 @@ for file in glob("$OUTDIR/report_*.tsv"):
 rows = []
 import nibabel as nib
 
-# Load cluster label maps
+# Load cluster label maps in their stored integer dtype (no float64 copy)
 label_maps = {
-    "FLAIR": nib.load("../mri_results/analysis_multimodal/clusters_flair.nii.gz").get_fdata(),
-    "DWI": nib.load("../mri_results/analysis_multimodal/clusters_dwi.nii.gz").get_fdata(),
-    "T1": nib.load("../mri_results/analysis_multimodal/clusters_t1.nii.gz").get_fdata(),
-    "SWI": nib.load("../mri_results/analysis_multimodal/clusters_swi.nii.gz").get_fdata(),
+    "FLAIR": np.asanyarray(nib.load("../mri_results/analysis_multimodal/clusters_flair.nii.gz").dataobj),
+    "DWI": np.asanyarray(nib.load("../mri_results/analysis_multimodal/clusters_dwi.nii.gz").dataobj),
+    "T1": np.asanyarray(nib.load("../mri_results/analysis_multimodal/clusters_t1.nii.gz").dataobj),
+    "SWI": np.asanyarray(nib.load("../mri_results/analysis_multimodal/clusters_swi.nii.gz").dataobj),
 }
 
-rows = []
+def overlap_counts(labels1, labels2):
+    """Voxel overlap of every (label1, label2) cluster pair, in one pass."""
+    both = (labels1 > 0) & (labels2 > 0)
+    stride = int(labels2.max()) + 1
+    keys = labels1[both].astype(np.int64) * stride + labels2[both].astype(np.int64)
+    keys, counts = np.unique(keys, return_counts=True)
+    return {(int(k // stride), int(k % stride)): int(n) for k, n in zip(keys, counts)}
+
+# One co-occurrence table per modality pair instead of a full-volume
+# mask comparison for every cluster pair.
+pair_overlaps = {
+    (mod1, mod2): overlap_counts(label_maps[mod1], label_maps[mod2])
+    for mod1 in reports for mod2 in label_maps if mod2 != mod1
+}
 
-for mod1, df1 in reports.items():
-    for _, row1 in df1.iterrows():
-        label1 = int(row1["Cluster Index"])
-        vox1 = row1["Voxels"]
-        mask1 = (label_maps[mod1] == label1)
+# Pull the report columns out once; the loops below index plain arrays
+# rather than boxing every row into a Series. Slicing df.to_numpy() keeps
+# the same row values (and dtype) that iterrows() would have produced.
+columns = {}
+for mod, df in reports.items():
+    values = df.to_numpy()
+    col = df.columns.get_loc
+    columns[mod] = (
+        values[:, col("Cluster Index")].astype(np.int64),
+        values[:, col("Voxels")],
+        values[:, [col("COG X (mm)"), col("COG Y (mm)"), col("COG Z (mm)")]],
+    )
 
+rows = []
+
+for mod1, (labels1, voxels1, cogs1) in columns.items():
+    for label1, vox1, (cog_x, cog_y, cog_z) in zip(labels1.tolist(), voxels1, cogs1):
         row_out = {
             "ID": f"{mod1}_{label1}",
             "Modality": mod1,
             "Voxels (cubic volume)": vox1,
-            "Centre-of-gravity (X-axis)": row1["COG X (mm)"],
-            "COG Y-axis": row1["COG Y (mm)"],
-            "COG Z-axis": row1["COG Z (mm)"]
+            "Centre-of-gravity (X-axis)": cog_x,
+            "COG Y-axis": cog_y,
+            "COG Z-axis": cog_z
         }
 
         for mod2 in label_maps:
             if mod2 == mod1:
                 continue
             overlaps = []
-            for _, row2 in reports[mod2].iterrows():
-                label2 = int(row2["Cluster Index"])
-                mask2 = (label_maps[mod2] == label2)
-
-                intersection = np.logical_and(mask1, mask2)
-                n_overlap = int(np.sum(intersection))
+            counts = pair_overlaps[mod1, mod2]
+            labels2, voxels2, _ = columns[mod2]
+            for label2, vox2 in zip(labels2.tolist(), voxels2):
+                n_overlap = counts.get((label1, label2), 0)
 
                 if n_overlap > 0:
                     percent_self = n_overlap / vox1 * 100
-                    percent_other = n_overlap / row2["Voxels"] * 100
+                    percent_other = n_overlap / vox2 * 100
                     overlaps.append((f"{mod2}_{label2}", n_overlap, percent_self, percent_other))
 
             # pick top overlap if any
@@ -124,46 +124,41 @@ check_empty_dicom_fields() {
     local total_fields=${#critical_fields[@]}
     local empty_field_list=""
     
+    # Dump the header once and grep it per field, instead of re-reading the
+    # file with a fresh dump for every field. dicom_hdr is queried per tag.
+    local tool_used=""
+    local header_dump=""
+    local dump_status="ok"
+    if command -v dcmdump &>/dev/null; then
+        tool_used="dcmdump"
+    elif command -v gdcmdump &>/dev/null; then
+        tool_used="gdcmdump"
+    elif command -v dcminfo &>/dev/null; then
+        tool_used="dcminfo"
+    else
+        tool_used="dicom_hdr"
+    fi
+    if [ "$tool_used" != "dicom_hdr" ]; then
+        header_dump=$("$tool_used" "$dicom_file" 2>/dev/null) || dump_status="error"
+    fi
+    
     # Check each critical field with error handling
     for field in "${critical_fields[@]}"; do
-        local field_value=""
+        local field_value=0
         local field_status="unknown"
-        local tool_used=""
         
-        # Try to extract the field value using available tool with error handling
-        if command -v dcmdump &>/dev/null; then
-            tool_used="dcmdump"
-            { field_value=$(dcmdump "$dicom_file" | grep -E "\\($field\\)" | grep -v "no value" | wc -l); } 2>/dev/null || {
-                log_message "Error executing dcmdump for field $field - continuing"
-                field_value=0
-                field_status="error"
-            }
-        elif command -v gdcmdump &>/dev/null; then
-            tool_used="gdcmdump"
-            { field_value=$(gdcmdump "$dicom_file" | grep -E "\\($field\\)" | grep -v "no value" | wc -l); } 2>/dev/null || {
-                log_message "Error executing gdcmdump for field $field - continuing"
-                field_value=0
-                field_status="error"
-            }
-        elif command -v dcminfo &>/dev/null; then
-            tool_used="dcminfo"
-            { field_value=$(dcminfo "$dicom_file" | grep -E "\\($field\\)" | grep -v "no value" | wc -l); } 2>/dev/null || {
-                log_message "Error executing dcminfo for field $field - continuing"
-                field_value=0
-                field_status="error"
-            }
-        elif command -v dicom_hdr &>/dev/null; then
-            tool_used="dicom_hdr"
+        # Extract the field value using the available tool with error handling
+        if [ "$tool_used" = "dicom_hdr" ]; then
             { field_value=$(dicom_hdr -tag "($field)" "$dicom_file" | grep -v "no value" | wc -l); } 2>/dev/null || {
                 log_message "Error executing dicom_hdr for field $field - continuing"
                 field_value=0
                 field_status="error"
             }
+        elif [ "$dump_status" = "error" ]; then
+            log_message "Error executing $tool_used for field $field - continuing"
+            field_status="error"
         else
-            log_formatted "WARNING" "No DICOM header tool available to check field: $field"
-            field_value=0
-            field_status="no_tool"
-            continue
+            field_value=$(printf '%s\n' "$header_dump" | grep -E "\\($field\\)" | grep -v "no value" | wc -l) || field_value=0
         fi
         
         # Check if field is empty and log the result
@@ -308,10 +303,11 @@ extract_siemens_metadata() {
         return 1
     fi
     
-    # Extract basic metadata from dcmdump
-    local manufacturer=$(dcmdump "$dicom_file" | grep -E "\\(0008,0070\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
-    local model=$(dcmdump "$dicom_file" | grep -E "\\(0008,1090\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
-    local software=$(dcmdump "$dicom_file" | grep -E "\\(0018,1020\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
+    # Extract basic metadata from a single dcmdump of the header
+    local header_dump=$(dcmdump "$dicom_file" 2>/dev/null)
+    local manufacturer=$(printf '%s\n' "$header_dump" | grep -E "\\(0008,0070\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
+    local model=$(printf '%s\n' "$header_dump" | grep -E "\\(0008,1090\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
+    local software=$(printf '%s\n' "$header_dump" | grep -E "\\(0018,1020\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
     
     # Check for required fields
     local missing_fields=""
@@ -379,8 +375,9 @@ extract_scanner_metadata() {
             ;;
         "PHILIPS")
             # Extract Philips metadata
-            local model=$(dcmdump "$dicom_file" | grep -E "\\(0008,1090\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
-            local software=$(dcmdump "$dicom_file" | grep -E "\\(0018,1020\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
+            local header_dump=$(dcmdump "$dicom_file" 2>/dev/null)
+            local model=$(printf '%s\n' "$header_dump" | grep -E "\\(0008,1090\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
+            local software=$(printf '%s\n' "$header_dump" | grep -E "\\(0018,1020\\)" | sed -E 's/.*\[([^]]*)\].*/\1/' | tr -d '[:space:]')
             
             # Check for required fields
             local missing_fields=""
@@ -37,38 +37,68 @@ extract_cluster_coordinates_from_fsl() {
         echo "# Format: ClusterID VoxelsCount MaxX_vox MaxY_vox MaxZ_vox COGX_vox COGY_vox COGZ_vox COGX_mm COGY_mm COGZ_mm"
     } > "$output_coords"
     
-    # Skip header line and process cluster data
-    tail -n +2 "$cluster_report" | while read cluster_index voxels max_val max_x_vox max_y_vox max_z_vox cog_x_vox cog_y_vox cog_z_vox; do
-        # Skip empty lines or malformed data
-        if [ -z "$cluster_index" ] || [ -z "$cog_x_vox" ]; then
-            continue
-        fi
-        
+    # Read the voxel-to-world matrix once, then convert every cluster COG
+    # in a single awk pass (skip header line and malformed rows)
+    local matrix
+    matrix=$(get_voxel_to_world_matrix "$reference_nifti")
+    
+    while read -r cluster_index voxels max_x_vox max_y_vox max_z_vox cog_x_vox cog_y_vox cog_z_vox cog_x_mm cog_y_mm cog_z_mm; do
         log_message "Processing cluster $cluster_index: COG(${cog_x_vox}, ${cog_y_vox}, ${cog_z_vox}) voxels"
         
-        # Convert voxel coordinates to world coordinates using NIfTI header
-        local world_coords=$(convert_voxel_to_world_coordinates "$cog_x_vox" "$cog_y_vox" "$cog_z_vox" "$reference_nifti")
+        # Output cluster data with both voxel and world coordinates
+        echo "$cluster_index $voxels $max_x_vox $max_y_vox $max_z_vox $cog_x_vox $cog_y_vox $cog_z_vox $cog_x_mm $cog_y_mm $cog_z_mm"
         
-        if [ -n "$world_coords" ]; then
-            local cog_x_mm=$(echo "$world_coords" | cut -d',' -f1)
-            local cog_y_mm=$(echo "$world_coords" | cut -d',' -f2)
-            local cog_z_mm=$(echo "$world_coords" | cut -d',' -f3)
-            
-            # Output cluster data with both voxel and world coordinates
-            echo "$cluster_index $voxels $max_x_vox $max_y_vox $max_z_vox $cog_x_vox $cog_y_vox $cog_z_vox $cog_x_mm $cog_y_mm $cog_z_mm" >> "$output_coords"
-            
-            log_message "✓ Cluster $cluster_index: COG world coordinates ($cog_x_mm, $cog_y_mm, $cog_z_mm) mm"
-        else
-            log_formatted "WARNING" "Failed to convert voxel coordinates for cluster $cluster_index"
-        fi
-    done
+        log_message "✓ Cluster $cluster_index: COG world coordinates ($cog_x_mm, $cog_y_mm, $cog_z_mm) mm"
+    done < <(tail -n +2 "$cluster_report" \
+        | awk 'NF >= 9 { print $1, $2, $4, $5, $6, $7, $8, $9 }' \
+        | append_world_coordinates "$matrix" 6) >> "$output_coords"
     
     local cluster_count=$(tail -n +6 "$output_coords" | wc -l)
     log_formatted "SUCCESS" "Extracted coordinates for $cluster_count clusters"
     return 0
 }
 
-# Function to convert voxel coordinates to world coordinates using NIfTI sform/qform
+# Function to print the voxel-to-world matrix of a NIfTI file as 12 numbers
+# (3x4, row-major). Uses the sform when set, otherwise scales by pixdim.
+# The header is read with a single fslhd call.
+get_voxel_to_world_matrix() {
+    local nifti_file="$1"
+    
+    fslhd "$nifti_file" 2>/dev/null | awk '
+        $1 == "sform_code" { code = $2 }
+        $1 ~ /^pixdim[123]$/ { pixdim[substr($1, 7)] = $2 }
+        $1 ~ /^sto_xyz:[123]$/ { row = substr($1, 9); for (c = 1; c <= 4; c++) sform[row, c] = $(c + 1) }
+        END {
+            # Invalid or missing pixdim values fall back to 1 mm
+            for (i = 1; i <= 3; i++) if (pixdim[i] + 0 == 0) pixdim[i] = 1
+            if (code + 0 != 0 && ((3, 4) in sform)) {
+                for (r = 1; r <= 3; r++) for (c = 1; c <= 4; c++) printf "%s ", sform[r, c]
+            } else {
+                printf "%s 0 0 0 0 %s 0 0 0 0 %s 0 ", pixdim[1], pixdim[2], pixdim[3]
+            }
+            printf "\n"
+        }'
+}
+
+# Function to append world coordinates (mm) to every row on stdin. The
+# voxel triple starts at column $2 (default 1); $1 is the matrix printed by
+# get_voxel_to_world_matrix.
+append_world_coordinates() {
+    local matrix="$1"
+    local column="${2:-1}"
+    
+    awk -v m="$matrix" -v c="$column" '
+        BEGIN { split(m, a, " ") }
+        NF >= c + 2 {
+            x = $c; y = $(c + 1); z = $(c + 2)
+            printf "%s %.6f %.6f %.6f\n", $0,
+                a[1] * x + a[2] * y + a[3] * z + a[4],
+                a[5] * x + a[6] * y + a[7] * z + a[8],
+                a[9] * x + a[10] * y + a[11] * z + a[12]
+        }'
+}
+
+# Function to convert voxel coordinates to world coordinates using NIfTI sform
 convert_voxel_to_world_coordinates() {
     local vox_x="$1"
     local vox_y="$2"
@@ -81,61 +111,9 @@ convert_voxel_to_world_coordinates() {
         return 1
     fi
     
-    # Get basic image properties
-    local pixdim_x=$(fslval "$nifti_file" pixdim1 2>/dev/null || echo "1")
-    local pixdim_y=$(fslval "$nifti_file" pixdim2 2>/dev/null || echo "1")
-    local pixdim_z=$(fslval "$nifti_file" pixdim3 2>/dev/null || echo "1")
-    
-    # Check for valid pixdim values
-    if [ -z "$pixdim_x" ] || [ "$pixdim_x" = "0" ] || [ "$pixdim_x" = "0.000000" ]; then
-        pixdim_x="1"
-    fi
-    if [ -z "$pixdim_y" ] || [ "$pixdim_y" = "0" ] || [ "$pixdim_y" = "0.000000" ]; then
-        pixdim_y="1"
-    fi
-    if [ -z "$pixdim_z" ] || [ "$pixdim_z" = "0" ] || [ "$pixdim_z" = "0.000000" ]; then
-        pixdim_z="1"
-    fi
-    
-    # Get transformation matrix from NIfTI header (sform preferred, qform fallback)
-    local sform_code=$(fslval "$nifti_file" sform_code 2>/dev/null || echo "0")
-    
-    if [ "$sform_code" != "0" ] && [ "$sform_code" != "" ]; then
-        # Try to get sform matrix elements (these are the correct field names)
-        local sxx=$(fslval "$nifti_file" sto_xyz:1 2>/dev/null || echo "$pixdim_x")
-        local sxy=$(fslval "$nifti_file" sto_xyz:2 2>/dev/null || echo "0")
-        local sxz=$(fslval "$nifti_file" sto_xyz:3 2>/dev/null || echo "0")
-        local sx=$(fslval "$nifti_file" sto_xyz:4 2>/dev/null || echo "0")
-        
-        local syx=$(fslval "$nifti_file" sto_xyz:5 2>/dev/null || echo "0")
-        local syy=$(fslval "$nifti_file" sto_xyz:6 2>/dev/null || echo "$pixdim_y")
-        local syz=$(fslval "$nifti_file" sto_xyz:7 2>/dev/null || echo "0")
-        local sy=$(fslval "$nifti_file" sto_xyz:8 2>/dev/null || echo "0")
-        
-        local szx=$(fslval "$nifti_file" sto_xyz:9 2>/dev/null || echo "0")
-        local szy=$(fslval "$nifti_file" sto_xyz:10 2>/dev/null || echo "0")
-        local szz=$(fslval "$nifti_file" sto_xyz:11 2>/dev/null || echo "$pixdim_z")
-        local sz=$(fslval "$nifti_file" sto_xyz:12 2>/dev/null || echo "0")
-        
-        # Apply sform transformation: world = sform * [vox_x, vox_y, vox_z, 1]
-        # x_world = sxx*vox_x + sxy*vox_y + sxz*vox_z + sx
-        # y_world = syx*vox_x + syy*vox_y + syz*vox_z + sy
-        # z_world = szx*vox_x + szy*vox_y + szz*vox_z + sz
-        
-        local x_mm=$(echo "scale=6; $sxx * $vox_x + $sxy * $vox_y + $sxz * $vox_z + $sx" | bc -l 2>/dev/null || echo "$vox_x")
-        local y_mm=$(echo "scale=6; $syx * $vox_x + $syy * $vox_y + $syz * $vox_z + $sy" | bc -l 2>/dev/null || echo "$vox_y")
-        local z_mm=$(echo "scale=6; $szx * $vox_x + $szy * $vox_y + $szz * $vox_z + $sz" | bc -l 2>/dev/null || echo "$vox_z")
-        
-        echo "$x_mm,$y_mm,$z_mm"
-    else
-        # Fallback to simple voxel-to-world conversion using pixdim
-        # For most practical purposes, this gives reasonable approximations
-        local x_mm=$(echo "scale=6; $vox_x * $pixdim_x" | bc -l 2>/dev/null || echo "$vox_x")
-        local y_mm=$(echo "scale=6; $vox_y * $pixdim_y" | bc -l 2>/dev/null || echo "$vox_y")
-        local z_mm=$(echo "scale=6; $vox_z * $pixdim_z" | bc -l 2>/dev/null || echo "$vox_z")
-        
-        echo "$x_mm,$y_mm,$z_mm"
-    fi
+    echo "$vox_x $vox_y $vox_z" \
+        | append_world_coordinates "$(get_voxel_to_world_matrix "$nifti_file")" \
+        | awk '{ print $4 "," $5 "," $6 }'
 }
 
 # Function to apply reverse transformation chain to map clusters back to DICOM space
@@ -226,20 +204,75 @@ map_clusters_to_dicom_space() {
         fi
         
         # Output mapped coordinates
-        echo "$cluster_id $voxels $cog_x_mm $cog_y_mm $cog_z_mm $dicom_x_mm $dicom_y_mm $dicom_z_mm" >> "$output_dicom_coords"
-    done
+        echo "$cluster_id $voxels $cog_x_mm $cog_y_mm $cog_z_mm $dicom_x_mm $dicom_y_mm $dicom_z_mm"
+    done >> "$output_dicom_coords"
     
     local mapped_count=$(tail -n +6 "$output_dicom_coords" | wc -l)
     log_formatted "SUCCESS" "Mapped $mapped_count clusters to DICOM space"
     return 0
 }
 
+# Function to print one slice-table row for a DICOM file:
+# "DicomFile SliceLocation ImagePositionX ImagePositionY ImagePositionZ".
+# Prints nothing for non-DICOM files or files without position tags, and
+# always succeeds so it can run under run_parallel.
+extract_dicom_slice_row() {
+    local dicom_file="$1"
+    
+    if [ ! -f "$dicom_file" ] || ! file "$dicom_file" | grep -q -i "dicom\|medical"; then
+        return 0
+    fi
+    
+    # One dump per file, printing only the two position tags (+P).
+    # +P filters output, not loading: dcmdump defaults to --load-all,
+    # so -M (--load-short) is needed to leave long values such as
+    # PixelData unread.
+    local header
+    header=$(dcmdump -M +P SliceLocation +P ImagePositionPatient "$dicom_file" 2>/dev/null || echo "")
+    local slice_location=$(echo "$header" | grep "SliceLocation" | head -1 | sed 's/.*\[\(.*\)\].*/\1/' || echo "")
+    local image_position=$(echo "$header" | grep "ImagePositionPatient" | head -1 | sed 's/.*\[\(.*\)\].*/\1/' || echo "")
+    
+    if [ -n "$slice_location" ] || [ -n "$image_position" ]; then
+        # DICOM ImagePositionPatient is backslash-separated (e.g.
+        # "-12.3\45.6\-78.9"). `cut -d'\\'` is INVALID — cut requires a
+        # single-character delimiter and '\\' expands to two chars, so
+        # cut errors and every coordinate silently became "0". Use awk,
+        # whose -F field separator accepts the backslash regex '\\'.
+        local pos_x pos_y pos_z
+        pos_x=$(echo "$image_position" | awk -F'\\\\' '{print $1}'); pos_x="${pos_x:-0}"
+        pos_y=$(echo "$image_position" | awk -F'\\\\' '{print $2}'); pos_y="${pos_y:-0}"
+        pos_z=$(echo "$image_position" | awk -F'\\\\' '{print $3}'); pos_z="${pos_z:-$slice_location}"
+    
+        echo "$(basename "$dicom_file") $slice_location $pos_x $pos_y $pos_z"
+    fi
+    return 0
+}
+
+# Function to write the slice table for a DICOM directory: two header lines,
+# then one extract_dicom_slice_row line per DICOM file. Header reads are
+# independent, so they are spread over PARALLEL_JOBS via run_parallel
+# (sequential when GNU parallel is unavailable or jobs is 0). Rows arrive in
+# job-completion order, so they are sorted by file name: the matcher keeps
+# the first of equally near slices, and that must not vary between runs.
+build_dicom_slice_table() {
+    local dicom_directory="$1"
+    local slice_table="$2"
+    
+    {
+        echo "# DICOM slice information"
+        echo "# Format: DicomFile SliceLocation ImagePositionX ImagePositionY ImagePositionZ"
+    } > "$slice_table"
+    
+    run_parallel extract_dicom_slice_row "*" "$dicom_directory" "${PARALLEL_JOBS:-0}" 1 | LC_ALL=C sort >> "$slice_table"
+}
+
 # Function to match cluster coordinates to specific DICOM files
 match_clusters_to_dicom_files() {
     local dicom_coords="$1"         # File with cluster coordinates in DICOM space
     local dicom_directory="$2"      # Original DICOM directory
     local output_mapping="$3"       # Output file with cluster-to-DICOM mapping
     local tolerance="${4:-5.0}"     # Tolerance in mm for slice matching
+    local slice_table="${5:-}"      # Optional: prebuilt slice table (build_dicom_slice_table)
     
     log_formatted "INFO" "===== MATCHING CLUSTERS TO DICOM FILES ====="
     log_message "DICOM coordinates: $dicom_coords"
@@ -269,71 +302,52 @@ match_clusters_to_dicom_files() {
     if command -v dcmdump &> /dev/null; then
         log_message "Using dcmdump to extract DICOM slice positions..."
         
-        # Create temporary file for DICOM slice info
-        local dicom_slices="/tmp/dicom_slices_$$.txt"
-        {
-            echo "# DICOM slice information"
-            echo "# Format: DicomFile SliceLocation ImagePositionX ImagePositionY ImagePositionZ"
-        } > "$dicom_slices"
-        
-        # Extract slice information from all DICOM files
-        for dicom_file in "$dicom_directory"/*.dcm "$dicom_directory"/*.DCM "$dicom_directory"/*; do
-            if [ -f "$dicom_file" ] && file "$dicom_file" | grep -q -i "dicom\|medical"; then
-                local slice_location=$(dcmdump "$dicom_file" 2>/dev/null | grep "SliceLocation" | head -1 | sed 's/.*\[\(.*\)\].*/\1/' || echo "")
-                local image_position=$(dcmdump "$dicom_file" 2>/dev/null | grep "ImagePositionPatient" | head -1 | sed 's/.*\[\(.*\)\].*/\1/' || echo "")
-                
-                if [ -n "$slice_location" ] || [ -n "$image_position" ]; then
-                    # DICOM ImagePositionPatient is backslash-separated (e.g.
-                    # "-12.3\45.6\-78.9"). `cut -d'\\'` is INVALID — cut requires a
-                    # single-character delimiter and '\\' expands to two chars, so
-                    # cut errors and every coordinate silently became "0". Use awk,
-                    # whose -F field separator accepts the backslash regex '\\'.
-                    local pos_x pos_y pos_z
-                    pos_x=$(echo "$image_position" | awk -F'\\\\' '{print $1}'); pos_x="${pos_x:-0}"
-                    pos_y=$(echo "$image_position" | awk -F'\\\\' '{print $2}'); pos_y="${pos_y:-0}"
-                    pos_z=$(echo "$image_position" | awk -F'\\\\' '{print $3}'); pos_z="${pos_z:-$slice_location}"
-                    
-                    echo "$(basename "$dicom_file") $slice_location $pos_x $pos_y $pos_z" >> "$dicom_slices"
-                fi
-            fi
-        done
+        # Reuse a slice table built by the caller for this DICOM directory,
+        # otherwise build a temporary one
+        local dicom_slices="$slice_table"
+        if [ -z "$dicom_slices" ] || [ ! -f "$dicom_slices" ]; then
+            dicom_slices="/tmp/dicom_slices_$$.txt"
+            build_dicom_slice_table "$dicom_directory" "$dicom_slices"
+        fi
         
-        # Match clusters to DICOM slices
-        tail -n +6 "$dicom_coords" | while read cluster_id voxels orig_x orig_y orig_z dicom_x dicom_y dicom_z; do
-            if [ -z "$cluster_id" ] || [ -z "$dicom_z" ]; then
-                continue
-            fi
-            
+        # Match all clusters to DICOM slices in one awk pass: load the slice
+        # table (first file), then pick the nearest slice for every cluster
+        # row (second file). Distance is Z only; SliceLocation may be blank,
+        # so slice fields are indexed from the end.
+        while read -r status cluster_id voxels dicom_x dicom_y dicom_z best_match slice_location image_position best_distance; do
             log_message "Matching cluster $cluster_id at ($dicom_x, $dicom_y, $dicom_z) to DICOM files"
             
-            local best_match=""
-            local best_distance="999999"
-            
-            # Find closest DICOM slice
-            tail -n +3 "$dicom_slices" | while read dicom_file slice_loc pos_x pos_y pos_z; do
-                if [ -n "$pos_z" ] && [ -n "$dicom_z" ]; then
-                    # Calculate distance (simplified - Z distance only for now)
-                    local distance=$(echo "sqrt(($dicom_z - $pos_z)^2)" | bc -l 2>/dev/null || echo "999")
-                    
-                    if (( $(echo "$distance < $best_distance" | bc -l 2>/dev/null || echo "0") )); then
-                        best_distance="$distance"
-                        best_match="$dicom_file"
-                    fi
-                fi
-            done
-            
-            # Check if match is within tolerance
-            if [ -n "$best_match" ] && (( $(echo "$best_distance <= $tolerance" | bc -l 2>/dev/null || echo "0") )); then
-                echo "$cluster_id $voxels $best_match $slice_location $image_position $best_distance" >> "$output_mapping"
+            if [ "$status" = "MATCH" ]; then
+                echo "$cluster_id $voxels $best_match $slice_location $image_position $best_distance"
                 log_message "✓ Cluster $cluster_id matched to $best_match (distance: ${best_distance} mm)"
             else
-                echo "$cluster_id $voxels NO_MATCH - - - $best_distance" >> "$output_mapping"
+                echo "$cluster_id $voxels NO_MATCH - - - $best_distance"
                 log_formatted "WARNING" "Cluster $cluster_id: no DICOM match within tolerance (best: ${best_distance} mm)"
             fi
-        done
+        done < <(awk -v tol="$tolerance" '
+            FNR == NR {
+                if (FNR > 2 && NF >= 4) {
+                    n++; file[n] = $1; z[n] = $NF; loc[n] = (NF > 4 ? $2 : "-")
+                    pos[n] = $(NF-2) "\\" $(NF-1) "\\" $NF
+                }
+                next
+            }
+            FNR > 5 && NF >= 8 {
+                best = 999999; hit = 0
+                for (i = 1; i <= n; i++) {
+                    d = $8 - z[i]; if (d < 0) d = -d
+                    if (!hit || d < best) { best = d; hit = i }
+                }
+                status = (hit && best <= tol) ? "MATCH" : "NO_MATCH"
+                printf "%s %s %s %s %s %s ", status, $1, $2, $6, $7, $8
+                if (hit) printf "%s %s %s %.6f\n", file[hit], loc[hit], pos[hit], best
+                else printf "- - - %s\n", best
+            }' "$dicom_slices" "$dicom_coords") >> "$output_mapping"
         
         # Clean up
-        rm -f "$dicom_slices"
+        if [ "$dicom_slices" != "$slice_table" ]; then
+            rm -f "$dicom_slices"
+        fi
         
     else
         log_formatted "WARNING" "dcmdump not available - cannot extract DICOM slice positions"
@@ -341,8 +355,8 @@ match_clusters_to_dicom_files() {
         
         # Simple fallback - just list clusters without specific file matching
         tail -n +6 "$dicom_coords" | while read cluster_id voxels orig_x orig_y orig_z dicom_x dicom_y dicom_z; do
-            echo "$cluster_id $voxels UNKNOWN - - -" >> "$output_mapping"
-        done
+            echo "$cluster_id $voxels UNKNOWN - - -"
+        done >> "$output_mapping"
     fi
     
     local matched_count=$(tail -n +7 "$output_mapping" | grep -v "NO_MATCH" | wc -l)
@@ -382,6 +396,22 @@ perform_cluster_to_dicom_mapping() {
     
     log_message "Found ${#cluster_files[@]} cluster analysis files"
     
+    # Every cluster file is matched against the same DICOM directory, so
+    # read its slice positions once up front
+    local slice_table=""
+    if command -v dcmdump &> /dev/null && [ -d "$dicom_directory" ]; then
+        slice_table="/tmp/dicom_slices_$$.txt"
+        build_dicom_slice_table "$dicom_directory" "$slice_table"
+    fi
+    
+    # List candidate reference images once; each cluster file below only
+    # matches names against this list instead of re-walking the tree per
+    # search pattern
+    local nifti_files=()
+    while IFS= read -r -d '' file; do
+        nifti_files+=("$file")
+    done < <(find "$cluster_analysis_dir" -name "*.nii.gz" -print0 2>/dev/null)
+    
     # Process each cluster analysis file
     for cluster_file in "${cluster_files[@]}"; do
         local basename=$(basename "$cluster_file" .txt)
@@ -392,7 +422,13 @@ perform_cluster_to_dicom_mapping() {
         local search_patterns=("${basename}.nii.gz" "${basename%%_*}.nii.gz" "*$(echo "$basename" | cut -d'_' -f1)*.nii.gz")
         
         for pattern in "${search_patterns[@]}"; do
-            reference_nifti=$(find "$cluster_analysis_dir" -name "$pattern" | head -1)
+            reference_nifti=""
+            for nifti in ${nifti_files[@]+"${nifti_files[@]}"}; do
+                if [[ "${nifti##*/}" == $pattern ]]; then
+                    reference_nifti="$nifti"
+                    break
+                fi
+            done
             if [ -n "$reference_nifti" ] && [ -f "$reference_nifti" ]; then
                 break
             fi
@@ -415,11 +451,15 @@ perform_cluster_to_dicom_mapping() {
                 
                 # Step 3: Match to specific DICOM files
                 local dicom_mapping="${output_dir}/${basename}_dicom_mapping.txt"
-                match_clusters_to_dicom_files "$dicom_coords" "$dicom_directory" "$dicom_mapping"
+                match_clusters_to_dicom_files "$dicom_coords" "$dicom_directory" "$dicom_mapping" 5.0 "$slice_table"
             fi
         fi
     done
     
+    if [ -n "$slice_table" ]; then
+        rm -f "$slice_table"
+    fi
+    
     # Create summary report
     local summary_report="${output_dir}/cluster_dicom_mapping_summary.txt"
     {
@@ -447,8 +487,12 @@ perform_cluster_to_dicom_mapping() {
 
 # Export functions
 export -f extract_cluster_coordinates_from_fsl
+export -f get_voxel_to_world_matrix
+export -f append_world_coordinates
 export -f convert_voxel_to_world_coordinates
 export -f map_clusters_to_dicom_space
+export -f extract_dicom_slice_row
+export -f build_dicom_slice_table
 export -f match_clusters_to_dicom_files
 export -f perform_cluster_to_dicom_mapping
 
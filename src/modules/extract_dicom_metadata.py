@@ -4,14 +4,20 @@ DICOM metadata extraction script specifically designed for:
 - Siemens files in ~/DICOM (Image-XXXXX format)
 - Philips files in ~/DICOM2 (SE00000X/IM00000X format)
 
-Extracts metadata and outputs as JSON.
+Extracts metadata and outputs as JSON. Many files can be processed in one
+process with --dir or --manifest, which avoids paying interpreter and pydicom
+import cost per file.
 """
 
+import argparse
+import functools
 import sys
 import json
 import os
 import logging
 import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,6 +31,57 @@ except ImportError:
     HAS_PYDICOM = False
     logger.warning("pydicom library not found, using basic metadata extraction")
 
+# Declarative extraction schema: DICOM keyword -> output key. COMMON_FIELDS
+# are read from every file (with the default used when the tag is absent);
+# VENDOR_FIELDS are added once the normalized manufacturer is known.
+COMMON_FIELDS = {
+    "Manufacturer": ("manufacturer", "Unknown"),
+    "ManufacturerModelName": ("modelName", "Unknown"),
+    "StudyDate": ("studyDate", ""),
+    "StudyDescription": ("studyDescription", ""),
+    "SeriesDescription": ("seriesDescription", ""),
+}
+
+VENDOR_FIELDS = {
+    "SIEMENS": {
+        "ProtocolName": "protocolName",
+        "SequenceName": "sequenceName",
+        "SoftwareVersions": "softwareVersion",
+    },
+    # Philips often has specific private tags; extract what we can from
+    # standard tags
+    "PHILIPS": {
+        "StationName": "stationName",
+    },
+}
+
+# Every tag the schema consumes, plus field strength (converted separately).
+# Passed to dcmread as specific_tags so the parser never walks PixelData or
+# any other element we don't consume.
+METADATA_TAGS = [
+    *COMMON_FIELDS,
+    "MagneticFieldStrength",
+    *(keyword for fields in VENDOR_FIELDS.values() for keyword in fields),
+]
+
+# Buffer size for the DICOM file handle. pydicom 3 already scans
+# undefined-length elements in 8 KiB chunks; a larger buffered reader keeps
+# those chunked reads (and the tag-by-tag header walk) from each becoming a
+# read() syscall.
+READ_BUFFER_SIZE = 64 * 1024
+
+
+def read_dicom_header(dicom_file):
+    """
+    Read the metadata header of a DICOM file, skipping pixel data.
+    """
+    with open(dicom_file, "rb", buffering=READ_BUFFER_SIZE) as fp:
+        return pydicom.dcmread(
+            fp,
+            stop_before_pixels=True,
+            specific_tags=METADATA_TAGS,
+        )
+
 
 def extract_metadata_basic(dicom_file):
     """
@@ -50,47 +107,35 @@ def extract_metadata_basic(dicom_file):
     return metadata
 
 
-def extract_siemens_metadata(dataset):
+def scan_header(dataset):
     """
-    Extract Siemens-specific metadata.
+    Collect {keyword: value} for every element in the dataset in one pass,
+    so each field lookup afterwards is a plain dict probe rather than a
+    pydicom attribute resolution.
     """
-    metadata = {}
-
-    try:
-        # Protocol information
-        if hasattr(dataset, 'ProtocolName'):
-            metadata["protocolName"] = str(dataset.ProtocolName)
+    return {elem.keyword: elem.value for elem in dataset}
 
-        # Sequence information
-        if hasattr(dataset, 'SequenceName'):
-            metadata["sequenceName"] = str(dataset.SequenceName)
 
-        # Software version
-        if hasattr(dataset, 'SoftwareVersions'):
-            metadata["softwareVersion"] = str(dataset.SoftwareVersions)
+# Substring of the lower-cased Manufacturer tag -> normalized name. Checked
+# in order, so the short "ge" key must stay last.
+MANUFACTURER_NAMES = {
+    "siemens": "SIEMENS",
+    "philips": "PHILIPS",
+    "ge": "GE",
+}
 
-    except (AttributeError, ValueError) as e:
-        logger.warning("Error extracting Siemens metadata: %s", e)
 
-    return metadata
-
-
-def extract_philips_metadata(dataset):
+@functools.lru_cache(maxsize=64)
+def normalize_manufacturer(manufacturer):
     """
-    Extract Philips-specific metadata.
+    Map a raw Manufacturer tag to SIEMENS/PHILIPS/GE, else upper-case it.
+    Cached: a batch run sees the same few scanner names on every file.
     """
-    metadata = {}
-
-    try:
-        # Philips often has specific private tags
-        # Extract what we can from standard tags
-        if hasattr(dataset, 'StationName'):
-            metadata["stationName"] = str(dataset.StationName)
-
-    except (AttributeError, ValueError) as e:
-        logger.warning("Error extracting Philips metadata: %s", e)
-
-    return metadata
+    lowered = manufacturer.lower()
+    return next(
+        (name for key, name in MANUFACTURER_NAMES.items() if key in lowered),
+        manufacturer.upper(),
+    )
 
 
 def extract_metadata_pydicom(dicom_file):
@@ -100,70 +145,255 @@ def extract_metadata_pydicom(dicom_file):
     logger.info("Using pydicom to extract metadata from: %s", dicom_file)
 
     try:
-        # Read DICOM file
-        dataset = pydicom.dcmread(dicom_file)
+        # Read only the header tags we need - skips PixelData entirely -
+        # and walk it once; every field below is a dict lookup
+        header = scan_header(read_dicom_header(dicom_file))
 
         # Extract common metadata - ALL as strings for consistency
         metadata = {
-            "manufacturer": str(getattr(dataset, 'Manufacturer', "Unknown")),
-            "fieldStrength": "1.5T",  # Default that will be overridden if available
-            "modelName": str(getattr(dataset, 'ManufacturerModelName', "Unknown")),
-            "studyDate": str(getattr(dataset, 'StudyDate', "")),
-            "studyDescription": str(getattr(dataset, 'StudyDescription', "")),
-            "seriesDescription": str(getattr(dataset, 'SeriesDescription', "")),
-            "source": "pydicom"
+            out_key: str(header.get(keyword, default))
+            for keyword, (out_key, default) in COMMON_FIELDS.items()
         }
+        metadata["fieldStrength"] = "1.5T"  # Default that will be overridden if available
+        metadata["source"] = "pydicom"
 
-        # Try to get field strength from DICOM tags - save as STRING with units
+        # Field strength from Magnetic Field Strength (0018,0087) - save as
+        # STRING with units; otherwise keep the default 1.5T string
         try:
-            # Standard DICOM tag for Magnetic Field Strength (0018,0087)
-            if hasattr(dataset, 'MagneticFieldStrength'):
-                field_strength_value = float(dataset.MagneticFieldStrength)
+            if "MagneticFieldStrength" in header:
+                field_strength_value = float(header["MagneticFieldStrength"])
                 metadata["fieldStrength"] = f"{field_strength_value:.1f}T"
-            # Try to access by tag number directly as a tuple (correct PyDICOM way)
-            elif (0x0018, 0x0087) in dataset:
-                field_strength_value = float(dataset[0x0018, 0x0087].value)
-                metadata["fieldStrength"] = f"{field_strength_value:.1f}T"
-            # Otherwise keep the default 1.5T string
-        except (ValueError, TypeError, KeyError) as e:
+        except (ValueError, TypeError) as e:
             logger.warning("Error reading field strength, using default: %s", e)
 
-        # Normalize manufacturer name
+        # Normalize manufacturer name and add vendor-specific metadata
         if metadata["manufacturer"]:
-            if "siemens" in metadata["manufacturer"].lower():
-                metadata["manufacturer"] = "SIEMENS"
-                # Add Siemens-specific metadata
-                metadata.update(extract_siemens_metadata(dataset))
-            elif "philips" in metadata["manufacturer"].lower():
-                metadata["manufacturer"] = "PHILIPS"
-                # Add Philips-specific metadata
-                metadata.update(extract_philips_metadata(dataset))
-            elif "ge" in metadata["manufacturer"].lower():
-                metadata["manufacturer"] = "GE"
-            else:
-                metadata["manufacturer"] = metadata["manufacturer"].upper()
+            metadata["manufacturer"] = normalize_manufacturer(metadata["manufacturer"])
+            for keyword, out_key in VENDOR_FIELDS.get(metadata["manufacturer"], {}).items():
+                if keyword in header:
+                    metadata[out_key] = str(header[keyword])
 
         logger.info("Successfully extracted metadata: %s", metadata['manufacturer'])
         return metadata
 
-    except (OSError, ValueError) as e:
+    except (OSError, ValueError, pydicom.errors.InvalidDicomError) as e:
         logger.error("Error reading DICOM file: %s", e)
         return extract_metadata_basic(dicom_file)
 
 
+# Files handed to each batch worker per task; keeps pool IPC overhead low
+# relative to the ~ms per-file parse cost.
+BATCH_CHUNKSIZE = 32
+
 # Define standard output directories
 RESULTS_DIR = "../mri_results"
 METADATA_DIR = os.path.join(RESULTS_DIR, "metadata")
 
 
-def main():
-    """Main function to extract metadata from DICOM file."""
-    if len(sys.argv) < 3:
-        print(f"Usage: {sys.argv[0]} <dicom_file> <output_json>", file=sys.stderr)
-        sys.exit(1)
+def extract_metadata(dicom_file):
+    """
+    Extract metadata from one DICOM file, adding execution information.
+    """
+    if HAS_PYDICOM:
+        metadata = extract_metadata_pydicom(dicom_file)
+    else:
+        metadata = extract_metadata_basic(dicom_file)
+
+    # Add execution information as strings. inputMtime/inputSize let a
+    # re-run recognise that this JSON is already current (is_up_to_date);
+    # they are left off fallback results so those are retried next run
+    # (e.g. once pydicom is installed or the file reads cleanly).
+    metadata["extractionTime"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    metadata["inputFile"] = os.path.basename(dicom_file)
+    if metadata.get("source") == "pydicom":
+        stat = os.stat(dicom_file)
+        metadata["inputMtime"] = str(stat.st_mtime_ns)
+        metadata["inputSize"] = str(stat.st_size)
+    return metadata
+
+
+def is_up_to_date(dicom_file, output_file):
+    """
+    True when output_file was extracted from this dicom_file as it is now
+    (same name, mtime and size), so the DICOM does not need re-reading.
+    """
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        stat = os.stat(dicom_file)
+    except (OSError, ValueError):
+        return False
+
+    return (
+        isinstance(previous, dict)
+        and previous.get("inputFile") == os.path.basename(dicom_file)
+        and previous.get("inputMtime") == str(stat.st_mtime_ns)
+        and previous.get("inputSize") == str(stat.st_size)
+    )
+
+
+def write_metadata(metadata, output_file, pretty=True):
+    """
+    Write a metadata dict to a JSON file. Returns True on success.
+
+    Compact output (pretty=False) stays on the C encoder; indent=2 goes
+    through the pure-Python pretty-printer.
+    """
+    try:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            if pretty:
+                json.dump(metadata, f, indent=2)
+            else:
+                json.dump(metadata, f, separators=(',', ':'))
+        logger.info("Metadata written to %s", output_file)
+        return True
+    except OSError as e:
+        logger.error("Error writing metadata to file: %s", e)
+        return False
+
+
+def list_batch_inputs(input_path, from_manifest):
+    """
+    Resolve the DICOM files for batch mode: one path per line of a manifest,
+    or every regular file directly inside a directory.
+    """
+    if from_manifest:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    return sorted(
+        entry.path for entry in os.scandir(input_path)
+        if entry.is_file() and not entry.name.startswith('.')
+    )
 
-    dicom_file = sys.argv[1]
-    output_file = sys.argv[2]
+
+def batch_output_names(dicom_files):
+    """
+    Output JSON path, relative to the batch output directory, for each input.
+
+    Inputs are mirrored relative to their common parent directory, so files
+    that share a name in different series directories (Philips
+    SE00000X/IM00000X) get distinct outputs, while files from a single
+    directory map to plain <basename>.json.
+    """
+    if not dicom_files:
+        return []
+    paths = [os.path.abspath(dicom_file) for dicom_file in dicom_files]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return [os.path.relpath(path, root) + ".json" for path in paths]
+
+
+def process_batch_file(dicom_file, output_file, pretty=False, force=False):
+    """
+    Extract and write the metadata for one batch input. Returns "written",
+    "skipped" (JSON already up to date) or "failed".
+    """
+    if not os.path.isfile(dicom_file):
+        logger.error("DICOM file does not exist: %s", dicom_file)
+        return "failed"
+
+    if not force and is_up_to_date(dicom_file, output_file):
+        return "skipped"
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    if not write_metadata(extract_metadata(dicom_file), output_file, pretty):
+        return "failed"
+    return "written"
+
+
+def run_batch(dicom_files, output_dir, pretty=False, force=False, workers=1):
+    """
+    Extract metadata for many DICOM files in one process, writing one JSON
+    per input into output_dir (named by batch_output_names). Output is
+    compact JSON unless pretty is set; files whose JSON is already current
+    are skipped unless force is set. With workers > 1 the files are spread
+    over a process pool (0 = one worker per CPU). Returns the number of
+    files that could not be processed.
+    """
+    output_names = batch_output_names(dicom_files)
+    duplicates = sorted(
+        name for name, count in Counter(output_names).items() if count > 1
+    )
+    if duplicates:
+        # Only reachable when the same file is listed more than once
+        logger.error(
+            "Batch inputs map to the same output file: %s", ", ".join(duplicates)
+        )
+        return len(dicom_files)
+    output_files = [os.path.join(output_dir, name) for name in output_names]
+
+    os.makedirs(output_dir, exist_ok=True)
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(dicom_files)))
+
+    task = functools.partial(process_batch_file, pretty=pretty, force=force)
+    if workers > 1:
+        logger.info("Using %d worker processes", workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                task, dicom_files, output_files, chunksize=BATCH_CHUNKSIZE,
+            ))
+    else:
+        results = [
+            task(dicom_file, output_file)
+            for dicom_file, output_file in zip(dicom_files, output_files)
+        ]
+
+    failures = results.count("failed")
+    skipped = results.count("skipped")
+    logger.info(
+        "Batch extraction finished: %d of %d files written to %s (%d already up to date)",
+        results.count("written"), len(dicom_files), output_dir, skipped,
+    )
+    return failures
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Extract DICOM metadata and write it as JSON.",
+        usage=(
+            "%(prog)s <dicom_file> <output_json>\n"
+            "       %(prog)s --dir <dicom_dir> <output_dir>\n"
+            "       %(prog)s --manifest <paths.txt> <output_dir>"
+        ),
+    )
+    parser.add_argument("input", help="DICOM file, DICOM directory (--dir) or manifest (--manifest)")
+    parser.add_argument("output", help="output JSON file, or output directory in batch mode")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dir", action="store_true",
+                      help="process every file in the input directory")
+    mode.add_argument("--manifest", action="store_true",
+                      help="process the DICOM paths listed one per line in the input file")
+    parser.add_argument("--pretty", action="store_true",
+                        help="indent batch-mode JSON (single-file output is always indented)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes for batch mode (0 = one per CPU, default 1)")
+    parser.add_argument("--force", action="store_true",
+                        help="re-extract even when the output JSON is already up to date")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Main function to extract metadata from one or many DICOM files."""
+    args = parse_args(argv)
+
+    if args.dir or args.manifest:
+        if not os.path.exists(args.input):
+            logger.error("Batch input does not exist: %s", args.input)
+            sys.exit(1)
+        try:
+            dicom_files = list_batch_inputs(args.input, args.manifest)
+        except OSError as e:
+            logger.error("Cannot read batch input %s: %s", args.input, e)
+            sys.exit(1)
+        logger.info("Processing %d DICOM files in batch mode", len(dicom_files))
+        return 1 if run_batch(
+            dicom_files, args.output, args.pretty, args.force, args.workers,
+        ) else 0
+
+    dicom_file = args.input
+    output_file = args.output
 
     if not os.path.exists(dicom_file):
         logger.error("DICOM file does not exist: %s", dicom_file)
@@ -181,18 +411,15 @@ def main():
 
     logger.info("Output will be written to: %s", output_file)
 
+    if not args.force and is_up_to_date(dicom_file, output_file):
+        logger.info("Metadata already up to date, skipping: %s", output_file)
+        print(f"Metadata already up to date: {output_file}")
+        return 0
+
     # Make sure the parent directory exists
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-    # Extract metadata
-    if HAS_PYDICOM:
-        metadata = extract_metadata_pydicom(dicom_file)
-    else:
-        metadata = extract_metadata_basic(dicom_file)
-
-    # Add execution information as strings
-    metadata["extractionTime"] = time.strftime("%Y-%m-%d %H:%M:%S")
-    metadata["inputFile"] = os.path.basename(dicom_file)
+    metadata = extract_metadata(dicom_file)
 
     # Log important metadata for verification
     logger.info(
@@ -202,19 +429,13 @@ def main():
         metadata.get('modelName', 'Unknown'),
     )
 
-    # Write metadata to output file
-    try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2)
-        logger.info("Metadata written to %s", output_file)
-        print(
-            "Metadata extracted successfully:"
-            f" {metadata['manufacturer']} {metadata.get('modelName', '')}"
-        )
-    except OSError as e:
-        logger.error("Error writing metadata to file: %s", e)
+    if not write_metadata(metadata, output_file):
         sys.exit(1)
 
+    print(
+        "Metadata extracted successfully:"
+        f" {metadata['manufacturer']} {metadata.get('modelName', '')}"
+    )
     return 0
 
 
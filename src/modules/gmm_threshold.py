@@ -85,8 +85,10 @@ def extract_values(zscore_path, mask_path):
     zscore_img = nib.load(zscore_path)
     mask_img = nib.load(mask_path)
 
-    zscore_data = zscore_img.get_fdata()
-    mask_data = mask_img.get_fdata()
+    # Native on-disk dtype (usually float32) rather than a float64 copy of
+    # each whole volume; only the extracted values are promoted below.
+    zscore_data = np.asanyarray(zscore_img.dataobj)
+    mask_data = np.asanyarray(mask_img.dataobj)
 
     if zscore_data.shape != mask_data.shape:
         raise ValueError(
@@ -106,7 +108,7 @@ def extract_values(zscore_path, mask_path):
 
     # Keep only finite non-zero values
     valid = np.isfinite(masked_values) & (masked_values != 0)
-    values = masked_values[valid]
+    values = masked_values[valid].astype(np.float64)
 
     log(f"Finite non-zero values extracted: {len(values)}")
     return values
@@ -220,10 +220,14 @@ import_convert_dicom_to_nifti() {
   # If primary pattern doesn't find anything, try alternative patterns
   if [ $total_dicom_files -eq 0 ]; then
     log_message "No files found with primary pattern, trying alternative patterns..."
-    for pattern in ${DICOM_ADDITIONAL_PATTERNS:-"*.dcm IM* Image* *.[0-9][0-9][0-9][0-9] DICOM*"}; do
-      local pattern_count=$(find "$dicom_dir" -type f -name "$pattern" 2>/dev/null | wc -l)
-      total_dicom_files=$((total_dicom_files + pattern_count))
+    # One walk of the tree with the patterns OR'ed together (a file matching
+    # several patterns, e.g. IM_0001.dcm, is counted once)
+    local patterns=() name_args=()
+    read -r -a patterns <<< "${DICOM_ADDITIONAL_PATTERNS:-*.dcm IM* Image* *.[0-9][0-9][0-9][0-9] DICOM*}"
+    for pattern in "${patterns[@]}"; do
+      name_args+=(${name_args[@]+-o} -name "$pattern")
     done
+    total_dicom_files=$(find "$dicom_dir" -type f \( "${name_args[@]}" \) 2>/dev/null | wc -l)
   fi
   
   log_message "Total DICOM files found: $total_dicom_files"
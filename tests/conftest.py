@@ -0,0 +1,42 @@
+"""Shared pytest fixtures for the Python module tests."""
+
+import pytest
+
+
+@pytest.fixture
+def make_dicom():
+    """Factory writing a minimal SYNTHETIC MR DICOM file (header + 4x4 pixel block).
+
+    Call as ``make_dicom(path, **tags)``; each keyword is set on the dataset
+    as a DICOM keyword (e.g. ``Manufacturer="SIEMENS"``). Returns the path
+    as a string. Tests using it are skipped when pydicom is not installed.
+    """
+    pytest.importorskip("pydicom")
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, MRImageStorage, generate_uid
+
+    def make(path, **tags):
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = MRImageStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+        ds = FileDataset(str(path), {}, file_meta=meta, preamble=b"\0" * 128)
+        ds.SOPClassUID = MRImageStorage
+        ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+        ds.Modality = "MR"
+        for keyword, value in tags.items():
+            setattr(ds, keyword, value)
+        ds.Rows = 4
+        ds.Columns = 4
+        ds.BitsAllocated = 16
+        ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.SamplesPerPixel = 1
+        ds.PixelRepresentation = 0
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.PixelData = b"\x01\x00" * 16
+        ds.save_as(str(path), enforce_file_format=True)
+        return str(path)
+
+    return make
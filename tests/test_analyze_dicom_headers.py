@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Unit tests for analyze_dicom_headers.py (dcm2niix duplicate-field report).
+
+Run:
+    python3 -m pytest tests/test_analyze_dicom_headers.py -v
+    python3 tests/test_analyze_dicom_headers.py      # standalone
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "modules"))
+
+import analyze_dicom_headers as adh  # noqa: E402
+
+
+# --------------------------------------------------------------------------- #
+# pydicom backend
+# --------------------------------------------------------------------------- #
+
+
+def test_pydicom_empty_element_reads_as_missing(tmp_path, make_dicom):
+    path = make_dicom(tmp_path / "IM0001", InstanceNumber=3, SeriesTime="")
+    fields = adh._read_fields_pydicom(path)
+    assert fields["InstanceNumber"] == "3"
+    assert fields["SeriesTime"] is None
+    assert fields["AcquisitionTime"] is None
+
+
+def test_empty_field_in_every_file_is_not_identical(tmp_path, capsys, make_dicom):
+    if not adh.HAS_PYDICOM:
+        pytest.skip("pydicom not installed")
+    for i in range(3):
+        make_dicom(tmp_path / f"IM000{i}", InstanceNumber=i + 1, SeriesTime="")
+    adh.analyze_dicom_directory(str(tmp_path), workers=1)
+    out = capsys.readouterr().out
+    assert "SeriesTime: IDENTICAL" not in out
+    assert "InstanceNumber: 3 unique values out of 3 files" in out
+    assert "Critical fields with identical values" not in out
+
+
+# --------------------------------------------------------------------------- #
+# dcmdump backend
+# --------------------------------------------------------------------------- #
+
+
+DCMDUMP_OUTPUT = """\
+# Dicom-File-Format
+
+# Dicom-Meta-Information-Header
+# Used TransferSyntax: Little Endian Explicit
+(0002,0010) UI =LittleEndianExplicit                    #  20, 1 TransferSyntaxUID
+
+# Dicom-Data-Set
+# Used TransferSyntax: Little Endian Explicit
+(0008,0031) TM (no value available)                     #   0, 0 SeriesTime
+(0008,0032) TM [101530.000000]                          #  14, 1 AcquisitionTime
+(0008,1140) SQ (Sequence with explicit length #=1)      #  64, 1 ReferencedImageSequence
+  (fffe,e000) na (Item with explicit length #=2)          #  56, 1 Item
+    (0008,1150) UI =MRImageStorage                          #  26, 1 ReferencedSOPClassUID
+    (0020,0013) IS [99]                                     #   2, 1 InstanceNumber
+  (fffe,e00d) na (ItemDelimitationItem for re-encoding)   #   0, 0 ItemDelimitationItem
+(fffe,e0dd) na (SequenceDelimitationItem for re-encod.) #   0, 0 SequenceDelimitationItem
+(0020,0011) IS [4]                                      #   2, 1 SeriesNumber
+(0020,0013) IS [7]                                      #   2, 1 InstanceNumber
+(0020,1041) DS [-12.5 ]                                 #   6, 1 SliceLocation
+"""
+
+
+def test_dcmdump_fields_ignore_nested_sequence_items():
+    fields = adh.extract_dicom_fields(DCMDUMP_OUTPUT)
+    assert fields["InstanceNumber"] == "7"
+    assert fields["SeriesNumber"] == "4"
+    assert fields["AcquisitionTime"] == "101530.000000"
+    assert fields["SliceLocation"] == "-12.5"
+
+
+def test_dcmdump_no_value_available_is_missing():
+    fields = adh.extract_dicom_fields(DCMDUMP_OUTPUT)
+    assert fields["SeriesTime"] is None
+    assert fields["ContentTime"] is None
+    assert set(fields) == set(adh.CRITICAL_FIELDS)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
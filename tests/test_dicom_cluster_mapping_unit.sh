@@ -0,0 +1,181 @@
+#!/usr/bin/env bash
+#
+# test_dicom_cluster_mapping_unit.sh - Unit tests for src/modules/dicom_cluster_mapping.sh
+#
+# Tests:
+#   - get_voxel_to_world_matrix (sform, pixdim fallback) / append_world_coordinates
+#   - extract_cluster_coordinates_from_fsl (COG voxel -> mm for every cluster)
+#   - match_clusters_to_dicom_files (nearest slice within tolerance, NO_MATCH,
+#     slice rows without SliceLocation) against a prebuilt slice table
+#
+# No FSL or DCMTK required: fslhd and dcmdump are mocked and the slice table
+# is written by hand (tests/test_dicom_mapping_integration.sh covers the real tools).
+#
+
+set -u
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+source "$SCRIPT_DIR/test_helpers.sh"
+
+# ── Bootstrap ─────────────────────────────────────────────────────────────────
+init_test_suite "dicom_cluster_mapping.sh Unit Tests"
+setup_test_environment
+
+# match_clusters_to_dicom_files only matches slices when dcmdump is on PATH
+create_mock_dcmdump
+
+# fslhd mock: the test "NIfTI" files hold the header text fslhd would print
+cat > "$TEMP_TEST_DIR/mock_bin/fslhd" << 'MOCK_EOF'
+#!/usr/bin/env bash
+cat "$1"
+MOCK_EOF
+chmod +x "$TEMP_TEST_DIR/mock_bin/fslhd"
+
+load_environment_module
+set +e
+
+if [[ -f "$PROJECT_ROOT/src/modules/dicom_cluster_mapping.sh" ]]; then
+    source "$PROJECT_ROOT/src/modules/dicom_cluster_mapping.sh" 2>/dev/null || true
+    echo "Loaded dicom_cluster_mapping.sh"
+else
+    echo -e "${RED}ERROR: dicom_cluster_mapping.sh not found${NC}"
+    exit 1
+fi
+
+# ══════════════════════════════════════════════════════════════════════════════
+# 1. Function Availability
+# ══════════════════════════════════════════════════════════════════════════════
+begin_test_group "1. Function Availability"
+
+assert_function_exists "get_voxel_to_world_matrix"       "get_voxel_to_world_matrix defined"
+assert_function_exists "append_world_coordinates"        "append_world_coordinates defined"
+assert_function_exists "match_clusters_to_dicom_files"   "match_clusters_to_dicom_files defined"
+assert_function_exists "build_dicom_slice_table"         "build_dicom_slice_table defined"
+assert_function_exists "extract_dicom_slice_row"         "extract_dicom_slice_row defined"
+
+# ══════════════════════════════════════════════════════════════════════════════
+# 2. Voxel-to-world conversion
+# ══════════════════════════════════════════════════════════════════════════════
+begin_test_group "2. Voxel-to-world conversion"
+
+HDR_DIR="$TEMP_TEST_DIR/headers"
+mkdir -p "$HDR_DIR"
+
+# 2 mm LAS image with sform set; the qform rows must be ignored
+printf '%s\t%s\n' \
+    "sizeof_hdr" "348" \
+    "pixdim1" "2.000000" \
+    "pixdim2" "2.000000" \
+    "pixdim3" "2.000000" \
+    "qform_code" "1" \
+    "qto_xyz:1" "1.000000 0.000000 0.000000 0.000000" \
+    "qto_xyz:2" "0.000000 1.000000 0.000000 0.000000" \
+    "qto_xyz:3" "0.000000 0.000000 1.000000 0.000000" \
+    "sform_code" "1" \
+    "sto_xyz:1" "-2.000000 0.000000 0.000000 90.000000" \
+    "sto_xyz:2" "0.000000 2.000000 0.000000 -126.000000" \
+    "sto_xyz:3" "0.000000 0.000000 2.000000 -72.000000" \
+    > "$HDR_DIR/sform.nii.gz"
+
+# No sform (and a zero pixdim3): scale by pixdim, 1 mm where it is invalid
+printf '%s\t%s\n' \
+    "pixdim1" "0.500000" \
+    "pixdim2" "0.500000" \
+    "pixdim3" "0.000000" \
+    "sform_code" "0" \
+    "sto_xyz:1" "0.000000 0.000000 0.000000 0.000000" \
+    > "$HDR_DIR/pixdim.nii.gz"
+
+# Word-split to drop the trailing separator
+assert_equals "-2.000000 0.000000 0.000000 90.000000 0.000000 2.000000 0.000000 -126.000000 0.000000 0.000000 2.000000 -72.000000" \
+    "$(echo $(get_voxel_to_world_matrix "$HDR_DIR/sform.nii.gz"))" \
+    "Matrix read from sto_xyz rows when sform_code is set"
+assert_equals "0.500000 0 0 0 0 0.500000 0 0 0 0 1 0" \
+    "$(echo $(get_voxel_to_world_matrix "$HDR_DIR/pixdim.nii.gz"))" \
+    "Matrix falls back to pixdim scaling without an sform"
+
+assert_equals "70.000000,-86.000000,-12.000000" \
+    "$(convert_voxel_to_world_coordinates 10 20 30 "$HDR_DIR/sform.nii.gz")" \
+    "convert_voxel_to_world_coordinates applies the sform"
+assert_equals "5.000000,10.000000,30.000000" \
+    "$(convert_voxel_to_world_coordinates 10 20 30 "$HDR_DIR/pixdim.nii.gz")" \
+    "convert_voxel_to_world_coordinates applies the pixdim fallback"
+assert_equals "a 10 20 30 70.000000 -86.000000 -12.000000" \
+    "$(echo "a 10 20 30" | append_world_coordinates "$(get_voxel_to_world_matrix "$HDR_DIR/sform.nii.gz")" 2)" \
+    "append_world_coordinates reads the voxel triple from the given column"
+
+# FSL cluster report: header line, then one row per cluster
+printf 'Cluster Index\tVoxels\tMAX\tMAX X (vox)\tMAX Y (vox)\tMAX Z (vox)\tCOG X (vox)\tCOG Y (vox)\tCOG Z (vox)\n' \
+    > "$HDR_DIR/clusters.txt"
+printf '2\t40\t3.1\t11\t21\t31\t10\t20\t30\n1\t12\t2.5\t46\t64\t37\t45.5\t63\t36\n' \
+    >> "$HDR_DIR/clusters.txt"
+
+extract_cluster_coordinates_from_fsl "$HDR_DIR/clusters.txt" "$HDR_DIR/sform.nii.gz" \
+    "$HDR_DIR/coords.txt" 2>/dev/null
+ec=$?
+assert_exit_code 0 "$ec" "extract_cluster_coordinates_from_fsl returns 0"
+coord_rows=$(tail -n +6 "$HDR_DIR/coords.txt")
+assert_equals "2 40 11 21 31 10 20 30 70.000000 -86.000000 -12.000000" \
+    "$(echo "$coord_rows" | sed -n 1p)" \
+    "First cluster COG converted to mm"
+assert_equals "1 12 46 64 37 45.5 63 36 -1.000000 0.000000 0.000000" \
+    "$(echo "$coord_rows" | sed -n 2p)" \
+    "Every cluster converted in one pass (fractional COG)"
+
+# ══════════════════════════════════════════════════════════════════════════════
+# 3. match_clusters_to_dicom_files
+# ══════════════════════════════════════════════════════════════════════════════
+begin_test_group "3. match_clusters_to_dicom_files"
+
+MATCH_DIR="$TEMP_TEST_DIR/matching"
+mkdir -p "$MATCH_DIR/dicom"
+
+# Slice table as written by build_dicom_slice_table; IM0003 has no
+# SliceLocation, so its row has only four fields
+cat > "$MATCH_DIR/slices.txt" << 'EOF'
+# DICOM slice information
+# Format: DicomFile SliceLocation ImagePositionX ImagePositionY ImagePositionZ
+IM0001 -10.0 -100.0 -120.0 -10.0
+IM0002 -5.0 -100.0 -120.0 -5.0
+IM0003 -100.0 -120.0 0.0
+EOF
+
+# Cluster coordinates as written by map_clusters_to_dicom_space (5 header lines)
+cat > "$MATCH_DIR/dicom_coords.txt" << 'EOF'
+# Cluster coordinates mapped to DICOM space
+# Generated: test
+# Source: test
+# Transform: none
+# Format: ClusterID VoxelsCount OrigX_mm OrigY_mm OrigZ_mm DicomX_mm DicomY_mm DicomZ_mm
+1 40 1.0 2.0 -6.0 1.0 2.0 -6.0
+2 12 1.0 2.0 0.5 1.0 2.0 0.5
+3 8 1.0 2.0 40.0 1.0 2.0 40.0
+EOF
+
+match_clusters_to_dicom_files "$MATCH_DIR/dicom_coords.txt" "$MATCH_DIR/dicom" \
+    "$MATCH_DIR/mapping.txt" 5.0 "$MATCH_DIR/slices.txt" 2>/dev/null
+ec=$?
+assert_exit_code 0 "$ec" "match_clusters_to_dicom_files returns 0"
+assert_file_exists "$MATCH_DIR/mapping.txt" "Mapping file written"
+
+mapping_rows=$(tail -n +7 "$MATCH_DIR/mapping.txt")
+assert_equals "3" "$(echo "$mapping_rows" | wc -l | tr -d ' ')" \
+    "One mapping row per cluster"
+assert_equals '1 40 IM0002 -5.0 -100.0\-120.0\-5.0 1.000000' \
+    "$(echo "$mapping_rows" | grep '^1 ')" \
+    "Cluster matched to the nearest slice within tolerance"
+assert_equals '2 12 IM0003 - -100.0\-120.0\0.0 0.500000' \
+    "$(echo "$mapping_rows" | grep '^2 ')" \
+    "Slice row without SliceLocation matches with '-' location"
+assert_equals '3 8 NO_MATCH - - - 40.000000' \
+    "$(echo "$mapping_rows" | grep '^3 ')" \
+    "Cluster beyond tolerance reported as NO_MATCH with best distance"
+
+# Slice table is caller-owned and must survive the match
+assert_file_exists "$MATCH_DIR/slices.txt" "Prebuilt slice table is not removed"
+
+# ══════════════════════════════════════════════════════════════════════════════
+# Cleanup & Summary
+# ══════════════════════════════════════════════════════════════════════════════
+cleanup_test_environment
+print_test_summary
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Unit tests for extract_dicom_metadata.py (DICOM header → JSON metadata).
+
+Writes small SYNTHETIC DICOM files with pydicom (header + a pixel block) and
+checks the single-file and batch CLIs emit the expected JSON.
+
+Run:
+    uv run pytest tests/test_extract_dicom_metadata.py -v
+    python3 tests/test_extract_dicom_metadata.py      # standalone
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pydicom")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "modules"))
+
+import extract_dicom_metadata as edm  # noqa: E402
+
+
+# --------------------------------------------------------------------------- #
+# Synthetic DICOM fixtures
+# --------------------------------------------------------------------------- #
+
+
+@pytest.fixture
+def make_dicom(make_dicom):
+    """Shared DICOM factory with a Siemens MR header by default."""
+    def make(path, manufacturer="SIEMENS Healthineers", **tags):
+        return make_dicom(path, **{
+            "Manufacturer": manufacturer,
+            "ManufacturerModelName": "MAGNETOM Sola",
+            "MagneticFieldStrength": 3,
+            "StudyDate": "20240101",
+            "SeriesDescription": "T2_FLAIR_SAG",
+            **tags,
+        })
+    return make
+
+
+# --------------------------------------------------------------------------- #
+# Extraction
+# --------------------------------------------------------------------------- #
+
+
+def test_siemens_header_extracted(tmp_path, make_dicom):
+    path = make_dicom(tmp_path / "IM0001", ProtocolName="t2_flair",
+                      SoftwareVersions="syngo MR XA31")
+    md = edm.extract_metadata_pydicom(path)
+    assert md["manufacturer"] == "SIEMENS"
+    assert md["fieldStrength"] == "3.0T"
+    assert md["modelName"] == "MAGNETOM Sola"
+    assert md["seriesDescription"] == "T2_FLAIR_SAG"
+    assert md["protocolName"] == "t2_flair"
+    assert md["softwareVersion"] == "syngo MR XA31"
+    assert md["source"] == "pydicom"
+
+
+def test_philips_header_extracted(tmp_path, make_dicom):
+    path = make_dicom(tmp_path / "IM0002", manufacturer="Philips Medical Systems",
+                      ManufacturerModelName="Ingenia", MagneticFieldStrength=1.5,
+                      StationName="MR-1")
+    md = edm.extract_metadata_pydicom(path)
+    assert md["manufacturer"] == "PHILIPS"
+    assert md["fieldStrength"] == "1.5T"
+    assert md["stationName"] == "MR-1"
+    assert "protocolName" not in md
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("SIEMENS", "SIEMENS"),
+    ("Siemens Healthineers", "SIEMENS"),
+    ("Philips Medical Systems", "PHILIPS"),
+    ("GE MEDICAL SYSTEMS", "GE"),
+    ("Toshiba_MEC", "TOSHIBA_MEC"),
+])
+def test_normalize_manufacturer(raw, expected):
+    assert edm.normalize_manufacturer(raw) == expected
+
+
+def test_non_dicom_falls_back_to_basic(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not a dicom file")
+    md = edm.extract_metadata_pydicom(str(path))
+    assert md["source"] == "basic-extraction-fallback"
+
+
+# --------------------------------------------------------------------------- #
+# CLI
+# --------------------------------------------------------------------------- #
+
+
+def test_single_file_cli(tmp_path, make_dicom):
+    path = make_dicom(tmp_path / "IM0001")
+    out = tmp_path / "meta" / "IM0001.json"
+    assert edm.main([path, str(out)]) == 0
+    md = json.loads(out.read_text())
+    assert md["manufacturer"] == "SIEMENS"
+    assert md["inputFile"] == "IM0001"
+
+
+def test_unchanged_input_is_not_re_extracted(tmp_path, make_dicom):
+    path = make_dicom(tmp_path / "IM0001")
+    out = tmp_path / "IM0001.json"
+    assert edm.main([path, str(out)]) == 0
+    assert edm.is_up_to_date(path, str(out))
+
+    # A stale marker in the JSON survives a normal re-run ...
+    md = json.loads(out.read_text())
+    md["manufacturer"] = "STALE"
+    out.write_text(json.dumps(md))
+    assert edm.main([path, str(out)]) == 0
+    assert json.loads(out.read_text())["manufacturer"] == "STALE"
+
+    # ... but not --force, nor a change to the DICOM file itself.
+    assert edm.main(["--force", path, str(out)]) == 0
+    assert json.loads(out.read_text())["manufacturer"] == "SIEMENS"
+    make_dicom(tmp_path / "IM0001", manufacturer="Philips", StationName="MR-1")
+    assert not edm.is_up_to_date(path, str(out))
+
+
+def test_fallback_output_is_never_up_to_date(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not a dicom file")
+    out = tmp_path / "notes.json"
+    assert edm.main([str(path), str(out)]) == 0
+    assert json.loads(out.read_text())["source"] == "basic-extraction-fallback"
+    assert not edm.is_up_to_date(str(path), str(out))
+
+
+def test_batch_dir_cli(tmp_path, make_dicom):
+    in_dir = tmp_path / "dicom"
+    in_dir.mkdir()
+    for i in range(3):
+        make_dicom(in_dir / f"IM000{i}")
+    out_dir = tmp_path / "out"
+    assert edm.main(["--dir", str(in_dir), str(out_dir)]) == 0
+    assert sorted(os.listdir(out_dir)) == [f"IM000{i}.json" for i in range(3)]
+    text = (out_dir / "IM0000.json").read_text()
+    assert "\n" not in text  # batch output is compact by default
+    assert json.loads(text)["inputFile"] == "IM0000"
+
+
+def test_batch_worker_pool_matches_serial(tmp_path, make_dicom):
+    in_dir = tmp_path / "dicom"
+    in_dir.mkdir()
+    for i in range(6):
+        make_dicom(in_dir / f"IM000{i}", ProtocolName=f"p{i}")
+    out_dir = tmp_path / "out"
+    assert edm.main(["--dir", str(in_dir), str(out_dir), "--workers", "3"]) == 0
+    for i in range(6):
+        md = json.loads((out_dir / f"IM000{i}.json").read_text())
+        assert md["protocolName"] == f"p{i}"
+
+
+def test_batch_manifest_reports_missing_files(tmp_path, make_dicom):
+    good = make_dicom(tmp_path / "IM0001")
+    manifest = tmp_path / "paths.txt"
+    manifest.write_text(f"{good}\n{tmp_path / 'missing'}\n\n")
+    out_dir = tmp_path / "out"
+    assert edm.main(["--manifest", str(manifest), str(out_dir)]) == 1
+    assert os.listdir(out_dir) == ["IM0001.json"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_manifest_same_name_in_different_series(tmp_path, workers, make_dicom):
+    # Philips layout: SE00000X/IM00000X repeats file names across series
+    for series, protocol in (("SE1", "flair"), ("SE2", "swi")):
+        (tmp_path / series).mkdir()
+        make_dicom(tmp_path / series / "IM000001", ProtocolName=protocol)
+    manifest = tmp_path / "paths.txt"
+    manifest.write_text(f"{tmp_path / 'SE1' / 'IM000001'}\n"
+                        f"{tmp_path / 'SE2' / 'IM000001'}\n")
+    out_dir = tmp_path / "out"
+    assert edm.main(["--manifest", str(manifest), str(out_dir),
+                     "--workers", str(workers)]) == 0
+    for series, protocol in (("SE1", "flair"), ("SE2", "swi")):
+        md = json.loads((out_dir / series / "IM000001.json").read_text())
+        assert md["protocolName"] == protocol
+
+
+@pytest.mark.parametrize("mode, make_input", [
+    ("--dir", lambda p: p.write_text("not a directory")),
+    ("--manifest", lambda p: p.mkdir()),
+])
+def test_batch_unreadable_input_exits_cleanly(tmp_path, mode, make_input):
+    batch_input = tmp_path / "input"
+    make_input(batch_input)
+    with pytest.raises(SystemExit) as exc:
+        edm.main([mode, str(batch_input), str(tmp_path / "out")])
+    assert exc.value.code == 1
+
+
+def test_batch_manifest_rejects_duplicate_entries(tmp_path, make_dicom):
+    path = make_dicom(tmp_path / "IM0001")
+    manifest = tmp_path / "paths.txt"
+    manifest.write_text(f"{path}\n{tmp_path / '.' / 'IM0001'}\n")
+    out_dir = tmp_path / "out"
+    assert edm.main(["--manifest", str(manifest), str(out_dir)]) == 1
+    assert not out_dir.exists()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))